@@ -21,7 +21,7 @@ from content_service.api.v1.content.dependencies import (
     get_current_user,
     get_current_user_from_query_token,
 )
-from content_service.api.v1.content.sse_helpers import create_progress_stream
+from content_service.api.v1.content.sse_helpers import create_chat_stream, create_progress_stream
 from content_service.core.services.service import ContentService
 from libs.models.user import User
 from libs import ExceptionBase, ErrorCode
@@ -129,6 +129,36 @@ async def chat_about_student(
     return ChatResponse(answer=answer)
 
 
+@router.post("/student/{student_response_id}/chat/stream")
+async def stream_chat_about_student(
+    student_response_id: int,
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    content_service: ContentService = Depends(get_content_service),
+):
+    """
+    Chat with AI about student performance, streaming the answer as Server-Sent Events.
+    Sends {"type": "delta", "content": ...} frames as the answer is generated, then {"type": "done"}.
+    """
+    chat_history = [{"role": msg.role, "content": msg.content} for msg in chat_request.chat_history]
+
+    chunks = await content_service.stream_chat_with_student_context(
+        student_response_id=student_response_id,
+        question=chat_request.question,
+        chat_history=chat_history,
+        user_id=current_user.id,
+    )
+
+    return StreamingResponse(
+        create_chat_stream(chunks),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @router.get("/{evaluation_id}/progress-stream")
 async def stream_evaluation_progress(
     evaluation_id: str,
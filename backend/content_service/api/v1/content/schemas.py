@@ -39,7 +39,7 @@ class QuestionDetail(BaseModel):
     question_text: str
     expected_answer: str
     max_score: Optional[float] = 10
-    keywords: Optional[list[str]] = []
+    keywords: list[str] = Field(default_factory=list)
 
 
 class ExamDetailResponse(BaseModel):
@@ -156,7 +156,7 @@ class ChatRequest(BaseModel):
     """Request for chat about student"""
 
     question: str
-    chat_history: Optional[list[ChatMessage]] = []
+    chat_history: list[ChatMessage] = Field(default_factory=list)
 
 
 class ChatResponse(BaseModel):
@@ -5,57 +5,180 @@ Reusable progress streaming logic
 
 import asyncio
 import json
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Union
+
+import orjson
+from pydantic import TypeAdapter
+from typing_extensions import NotRequired, TypedDict
 
 from libs.cache.progress_tracker import ProgressTracker
 
+FINAL_STATUSES = ("completed", "failed")
+
+
+class EvaluationProgressMetadata(TypedDict):
+    total_questions: NotRequired[int]
+    current_question: NotRequired[int]
+
+
+class StudentProgressMetadata(TypedDict):
+    evaluation_id: str
+    total_questions: NotRequired[int]
+    evaluated_questions: NotRequired[int]
+
+
+class EvaluationProgress(TypedDict):
+    """Progress frame written by ProgressTracker.set_evaluation_progress"""
+
+    task_type: str
+    task_id: str
+    percentage: float
+    message: str
+    status: str
+    metadata: EvaluationProgressMetadata
+
+
+class StudentProgress(TypedDict):
+    """Progress frame written by ProgressTracker.set_student_progress"""
+
+    task_type: str
+    task_id: str
+    percentage: float
+    message: str
+    status: str
+    metadata: StudentProgressMetadata
+
+
+# Schema-aware serializers built once per resource type (pydantic-core dumps the dicts directly)
+_PROGRESS_ADAPTERS: Dict[str, TypeAdapter] = {
+    "evaluation": TypeAdapter(EvaluationProgress),
+    "student_response": TypeAdapter(StudentProgress),
+}
+
+
+def _serialize_progress(resource_type: str, progress_data: Dict[str, Any]) -> bytes:
+    """Serialize a progress frame with the resource type's adapter, falling back to orjson."""
+    adapter = _PROGRESS_ADAPTERS.get(resource_type)
+    if adapter is None:
+        return orjson.dumps(progress_data)
+    return adapter.dump_json(progress_data, exclude_none=True)
+
+
+def _put_latest(queue: asyncio.Queue, item: Dict[str, Any]) -> None:
+    """Put item into a bounded queue, dropping the oldest pending item if it is full."""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(item)
+
 
 async def create_progress_stream(
-    resource_type: str, resource_id: str, max_duration_seconds: int = 300, poll_interval: float = 1.0
-) -> AsyncGenerator[str, None]:
+    resource_type: str,
+    resource_id: str,
+    max_duration_seconds: int = 300,
+    min_poll_interval: float = 0.1,
+    max_poll_interval: float = 2.0,
+    heartbeat_interval: float = 15.0,
+) -> AsyncGenerator[Union[str, bytes], None]:
     """
     Generic SSE progress stream generator.
 
+    A producer task polls Redis and keeps only the latest progress frame in a
+    single-slot queue, so bursts of updates are coalesced and memory per
+    connection stays bounded. The generator consumes that queue and sends a
+    keepalive comment whenever nothing arrives within heartbeat_interval.
+
+    Polling backs off exponentially (x1.5) from min_poll_interval up to
+    max_poll_interval while nothing changes, and resets on every change, so idle
+    resources cost fewer Redis reads and active ones update quickly.
+
     Args:
         resource_type: Type of resource ("evaluation" or "student_response")
         resource_id: Resource ID to track
         max_duration_seconds: Maximum stream duration (default 5 minutes)
-        poll_interval: Polling interval in seconds (default 1 second)
+        min_poll_interval: Polling interval after a change (default 0.1 seconds)
+        max_poll_interval: Upper bound for the backed-off polling interval (default 2 seconds)
+        heartbeat_interval: Seconds without updates before a keepalive is sent
 
     Yields:
-        SSE formatted messages
+        SSE formatted messages (progress frames are pre-encoded bytes)
     """
-    try:
-        # Send initial connection message
-        yield f"data: {json.dumps({'type': 'connected', 'message': 'Connected to progress stream'})}\n\n"
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
 
-        # Poll Redis for progress updates
+    async def produce() -> None:
         last_progress = None
-        max_iterations = int(max_duration_seconds / poll_interval)
-        iteration = 0
-
-        while iteration < max_iterations:
+        interval = min_poll_interval
+        while True:
             # Get current progress from Redis
             progress_data = ProgressTracker.get_progress(resource_type, resource_id)
 
-            if progress_data:
-                # Only send if progress changed
-                if progress_data != last_progress:
-                    yield f"data: {json.dumps(progress_data)}\n\n"
-                    last_progress = progress_data
+            # Only forward if progress changed
+            if progress_data and progress_data != last_progress:
+                _put_latest(queue, progress_data)
+                last_progress = progress_data
+
+                if progress_data.get("status") in FINAL_STATUSES:
+                    return
+
+                interval = min_poll_interval
+            else:
+                interval = min(interval * 1.5, max_poll_interval)
+
+            await asyncio.sleep(interval)
+
+    producer = None
+    try:
+        # Send initial connection message
+        yield f"data: {json.dumps({'type': 'connected', 'message': 'Connected to progress stream'})}\n\n"
 
-                # If completed or failed, send final message and close
-                if progress_data.get("status") in ["completed", "failed"]:
-                    yield f"data: {json.dumps({'type': 'done', 'status': progress_data.get('status')})}\n\n"
-                    break
+        producer = asyncio.create_task(produce())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_duration_seconds
 
-            # Wait before next poll
-            await asyncio.sleep(poll_interval)
-            iteration += 1
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                yield f"data: {json.dumps({'type': 'timeout', 'message': 'Stream timeout'})}\n\n"
+                break
 
-        # If max iterations reached, send timeout message
-        if iteration >= max_iterations:
-            yield f"data: {json.dumps({'type': 'timeout', 'message': 'Stream timeout'})}\n\n"
+            try:
+                progress_data = await asyncio.wait_for(queue.get(), timeout=min(heartbeat_interval, remaining))
+            except asyncio.TimeoutError:
+                # Surface producer failures (e.g. Redis errors) instead of idling until timeout
+                if producer.done():
+                    producer.result()
+                yield ": keepalive\n\n"
+                continue
+
+            yield b"data: " + _serialize_progress(resource_type, progress_data) + b"\n\n"
+
+            # If completed or failed, send final message and close
+            if progress_data.get("status") in FINAL_STATUSES:
+                yield f"data: {json.dumps({'type': 'done', 'status': progress_data.get('status')})}\n\n"
+                break
 
     except Exception:
         yield f"data: {json.dumps({'type': 'error', 'message': 'An error occurred'})}\n\n"
+
+    finally:
+        # Stop polling when the stream ends or the client disconnects
+        if producer is not None:
+            producer.cancel()
+
+
+async def create_chat_stream(chunks: AsyncIterator[str]) -> AsyncGenerator[bytes, None]:
+    """
+    SSE stream of a chat answer: one {"type": "delta", "content": ...} frame per text chunk,
+    then a {"type": "done"} frame once the answer is complete.
+
+    Args:
+        chunks: Answer text chunks (e.g. from ContentService.stream_chat_with_student_context)
+
+    Yields:
+        SSE formatted messages
+    """
+    try:
+        async for chunk in chunks:
+            yield b"data: " + orjson.dumps({"type": "delta", "content": chunk}) + b"\n\n"
+        yield b"data: " + orjson.dumps({"type": "done"}) + b"\n\n"
+    except Exception:
+        yield b"data: " + orjson.dumps({"type": "error", "message": "An error occurred"}) + b"\n\n"
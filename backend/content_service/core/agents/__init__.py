@@ -2,9 +2,9 @@
 Agents package for exam evaluation
 """
 
-from .exam_agent import ExamEvaluationAgent
+from .exam_agent import ExamEvaluationAgent, warmup
 from .models import AnswerKeyOutput, EvaluationResult, PerformanceAnalysis, QualityCheckResult
-from .tools import evaluate_answer_tool
+from .tools import evaluate_answer_tool, evaluate_answers_batch
 
 __all__ = [
     "ExamEvaluationAgent",
@@ -13,4 +13,6 @@ __all__ = [
     "PerformanceAnalysis",
     "QualityCheckResult",
     "evaluate_answer_tool",
+    "evaluate_answers_batch",
+    "warmup",
 ]
@@ -2,17 +2,73 @@
 Main Exam Evaluation Agent - Refactored with Self-Correction
 """
 
-from typing import Dict, Any, List
+from collections import deque
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+from google.api_core.exceptions import ResourceExhausted
+from google.generativeai.types import HarmBlockThreshold, HarmCategory
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-import json
+from langchain_core.runnables import Runnable
+import orjson
 
 from libs.settings import settings
 from .state import AgentState
+from .tools import connect_gemini
 from .workflow import exam_evaluation_graph
 
 
+# Static chat prompt, parsed once at import instead of on every chat turn
+_CHAT_SYSTEM_PROMPT = """Sen yardımcı bir eğitim danışmanısın. Öğrencinin sınav performansı hakkında doğrudan konuşarak yanıt veriyorsun.
+
+ÖNEMLİ: ASLA JSON, NESNE veya YAPILANDIRILMIŞ VERI KULLANMA!
+Sadece normal konuşma metni ile yanıt ver.
+
+YANIT KURALLARI:
+✓ Normal konuşma dili kullan (sanki birine anlatıyormuş gibi)
+✓ Maksimum 3-4 cümle
+✓ Gerekirse madde işaretleri kullan (•)
+✓ Türkçe yaz
+✗ JSON, dictionary, key-value formatı KULLANMA
+✗ Süslü parantez {{ }} KULLANMA
+
+BAĞLAM:
+{context}"""
+
+_CHAT_SYSTEM_TEMPLATE = SystemMessagePromptTemplate.from_template(_CHAT_SYSTEM_PROMPT)
+_CHAT_QUESTION_TEMPLATE = HumanMessagePromptTemplate.from_template("{question}")
+
+# Chat model and output parser, built once and shared by every chat turn (the client is thread-safe)
+_CHAT_LLM = ChatGoogleGenerativeAI(
+    model="gemini-2.0-flash-exp",
+    google_api_key=settings.GEMINI_API_KEY,
+    temperature=0.7,
+    max_output_tokens=512,  # Shorter responses (was 1024)
+    timeout=15,  # 15 second timeout
+    max_retries=2,  # Max 2 retries
+    safety_settings={
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+    },
+)
+_CHAT_OUTPUT_PARSER = StrOutputParser()
+
+# First characters of a response that accidentally came back as JSON
+_JSON_PREFIXES = frozenset("{[")
+
+
+def warmup() -> None:
+    """
+    Warm up a serving process before its first request: the graph, prompts and models are built
+    by importing this module, and the Gemini channels of the tools and the chat model are opened.
+    Run once per process after any fork (FastAPI lifespan, Celery worker_process_init).
+    """
+    connect_gemini(_CHAT_LLM)
+
+
 class ExamEvaluationAgent:
     """
     Agentic Exam Evaluation Service using LangGraph.
@@ -41,23 +97,11 @@ class ExamEvaluationAgent:
                 "_agent_trace": {...}  # Optional: reasoning trace
             }
         """
-        initial_state: AgentState = {
-            "task": "parse_answer_key",
-            "pdf_text": pdf_text,
-            "context": {},
-            "thoughts": [],
-            "actions": [],
-            "observations": [],
-            "intermediate_results": {},
-            "quality_checks": [],
-            "retry_count": 0,
-            "needs_review": False,
-            "final_output": {},
-            "status": "processing",
-            "error": "",
-            "confidence_scores": [],
-            "tool_call_logs": [],
-        }
+        # Nothing to parse - skip the graph (and its LLM call) entirely
+        if not pdf_text.strip():
+            return {"questions": [], "total_questions": 0, "max_possible_score": 0, "_agent_trace": {}}
+
+        initial_state = AgentState(task="parse_answer_key", pdf_text=pdf_text)
 
         final_state = self.graph.invoke(initial_state)
 
@@ -78,23 +122,11 @@ class ExamEvaluationAgent:
         """
         Parse student answers using agentic approach.
         """
-        initial_state: AgentState = {
-            "task": "parse_student",
-            "pdf_text": pdf_text,
-            "context": {"question_count": question_count},
-            "thoughts": [],
-            "actions": [],
-            "observations": [],
-            "intermediate_results": {},
-            "quality_checks": [],
-            "retry_count": 0,
-            "needs_review": False,
-            "final_output": {},
-            "status": "processing",
-            "error": "",
-            "confidence_scores": [],
-            "tool_call_logs": [],
-        }
+        # Nothing to parse - skip the graph (and its LLM call) entirely
+        if question_count <= 0 or not pdf_text.strip():
+            return []
+
+        initial_state = AgentState(task="parse_student", pdf_text=pdf_text, context={"question_count": question_count})
 
         final_state = self.graph.invoke(initial_state)
 
@@ -115,23 +147,19 @@ class ExamEvaluationAgent:
                 "_agent_trace": {...}
             }
         """
-        initial_state: AgentState = {
-            "task": "evaluate",
-            "pdf_text": "",
-            "context": {"answer_key": answer_key, "student_answers": student_answers},
-            "thoughts": [],
-            "actions": [],
-            "observations": [],
-            "intermediate_results": {},
-            "quality_checks": [],
-            "retry_count": 0,
-            "needs_review": False,
-            "final_output": {},
-            "status": "processing",
-            "error": "",
-            "confidence_scores": [],
-            "tool_call_logs": [],
-        }
+        # Nothing to evaluate - skip the graph (and its LLM calls) entirely
+        if not student_answers or not answer_key.get("questions"):
+            return {
+                "evaluations": [],
+                "needs_review": False,
+                "avg_confidence": 0.0,
+                "retry_count": 0,
+                "_agent_trace": {},
+            }
+
+        initial_state = AgentState(
+            task="evaluate", context={"answer_key": answer_key, "student_answers": student_answers}
+        )
 
         final_state = self.graph.invoke(initial_state)
 
@@ -139,14 +167,11 @@ class ExamEvaluationAgent:
             raise Exception(f"Failed to evaluate student: {final_state['error']}")
 
         # Enhance output with metadata
+        confidence_count = final_state["confidence_count"]
         result = {
             "evaluations": final_state["final_output"].get("evaluations", []),
             "needs_review": final_state.get("needs_review", False),
-            "avg_confidence": (
-                sum(final_state["confidence_scores"]) / len(final_state["confidence_scores"])
-                if final_state["confidence_scores"]
-                else 0.8
-            ),
+            "avg_confidence": final_state["confidence_sum"] / confidence_count if confidence_count else 0.8,
             "retry_count": final_state.get("retry_count", 0),
             "_agent_trace": {
                 "thoughts": final_state["thoughts"],
@@ -169,29 +194,20 @@ class ExamEvaluationAgent:
         """
         Analyze student performance with confidence.
         """
-        initial_state: AgentState = {
-            "task": "analyze",
-            "pdf_text": "",
-            "context": {
+        # No evaluated questions to analyze - skip the graph (and its LLM call) entirely
+        if not questions_data:
+            return {"strengths": [], "weaknesses": [], "confidence": 0.0}
+
+        initial_state = AgentState(
+            task="analyze",
+            context={
                 "student_name": student_name,
                 "total_score": total_score,
                 "max_score": max_score,
                 "percentage": percentage,
                 "questions_data": questions_data,
             },
-            "thoughts": [],
-            "actions": [],
-            "observations": [],
-            "intermediate_results": {},
-            "quality_checks": [],
-            "retry_count": 0,
-            "needs_review": False,
-            "final_output": {},
-            "status": "processing",
-            "error": "",
-            "confidence_scores": [],
-            "tool_call_logs": [],
-        }
+        )
 
         final_state = self.graph.invoke(initial_state)
 
@@ -214,106 +230,125 @@ class ExamEvaluationAgent:
         """
         Chat about student using simple LLM (not agent, as this is simpler task).
         """
-        from google.generativeai.types import HarmCategory, HarmBlockThreshold
-
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            google_api_key=settings.GEMINI_API_KEY,
-            temperature=0.7,
-            max_output_tokens=512,  # Shorter responses (was 1024)
-            timeout=15,  # 15 second timeout
-            max_retries=2,  # Max 2 retries
-            safety_settings={
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-            },
+        chain, chain_input = _chat_chain(
+            question, student_name, total_score, max_score, percentage, questions_data, chat_history
         )
 
-        # Build context - KEEP IT SHORT to avoid rate limits
-        context_parts = [
-            f"ÖĞRENCİ: {student_name}",
-            f"PUAN: {total_score:.1f}/{max_score:.1f} (%{percentage:.1f})",
-        ]
-
-        # Add condensed question info (max 5 questions)
-        if questions_data:
-            context_parts.append(f"\nSORULAR ({len(questions_data)} adet):")
-            for q in questions_data[:5]:  # Max 5 questions
-                context_parts.append(
-                    f"S{q['number']}: {q['score']:.1f}/{q['max_score']:.1f} - "
-                    f"{'✓' if q.get('is_correct') else '✗'} | "
-                    f"{q.get('feedback', '')[:80]}..."  # Shorter feedback
-                )
-
-        context = "\n".join(context_parts)
+        try:
+            return _clean_chat_response(chain.invoke(chain_input))
+        except Exception as e:
+            return _chat_error_message(e)
 
-        # Build chat history - Keep last 3 only (shorter context)
-        history_messages = []
-        if chat_history:
-            for msg in chat_history[-3:]:  # Only last 3 messages
-                role = "user" if msg["role"] == "user" else "assistant"
-                # Truncate long messages
-                content = msg["content"][:200] if len(msg["content"]) > 200 else msg["content"]
-                history_messages.append((role, content))
+    async def stream_chat_about_student(
+        self,
+        question: str,
+        student_name: str,
+        total_score: float,
+        max_score: float,
+        percentage: float,
+        summary: str,
+        questions_data: List[Dict[str, Any]],
+        chat_history: List[Dict[str, str]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Streaming chat_about_student: yields the answer in chunks as Gemini generates it.
+        A response that starts like JSON is buffered and yielded once, cleaned as in chat_about_student.
+        """
+        chain, chain_input = _chat_chain(
+            question, student_name, total_score, max_score, percentage, questions_data, chat_history
+        )
 
-        # Create prompt
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    """Sen yardımcı bir eğitim danışmanısın. Öğrencinin sınav performansı hakkında doğrudan konuşarak yanıt veriyorsun.
+        answered = False
+        try:
+            stream = chain.astream(chain_input)
+            async for chunk in stream:
+                if not answered:
+                    chunk = chunk.lstrip()
+                    if not chunk:
+                        continue
+                    if chunk[:1] in _JSON_PREFIXES:
+                        chunk = _clean_chat_response(chunk + "".join([rest async for rest in stream]))
+                answered = True
+                yield chunk
+            if not answered:
+                yield _clean_chat_response("")
+        except Exception as e:
+            # A partial answer stands; the error message only replaces an answer that never started
+            if not answered:
+                yield _chat_error_message(e)
+
+
+def _chat_chain(
+    question: str,
+    student_name: str,
+    total_score: float,
+    max_score: float,
+    percentage: float,
+    questions_data: List[Dict[str, Any]],
+    chat_history: Optional[List[Dict[str, str]]],
+) -> Tuple[Runnable, Dict[str, str]]:
+    """Chat chain and its input for one chat turn (shared by the plain and streaming chat)."""
+    # Build context - KEEP IT SHORT to avoid rate limits
+    context_parts = [
+        f"ÖĞRENCİ: {student_name}",
+        f"PUAN: {total_score:.1f}/{max_score:.1f} (%{percentage:.1f})",
+    ]
+
+    # Add condensed question info (max 5 questions)
+    if questions_data:
+        context_parts.append(f"\nSORULAR ({len(questions_data)} adet):")
+        for q in questions_data[:5]:  # Max 5 questions
+            context_parts.append(
+                f"S{q['number']}: {q['score']:.1f}/{q['max_score']:.1f} - "
+                f"{'✓' if q.get('is_correct') else '✗'} | "
+                f"{q.get('feedback', '')[:80]}..."  # Shorter feedback
+            )
+
+    context = "\n".join(context_parts)
+
+    # Build chat history - Keep last 3 only (shorter context)
+    # History is passed as concrete messages so its content is never parsed as a template
+    history_messages = [
+        # Truncate long messages
+        (HumanMessage if msg["role"] == "user" else AIMessage)(content=msg["content"][:200])
+        for msg in deque(chat_history or (), maxlen=3)  # Only last 3 messages
+    ]
+
+    # Create prompt from the prebuilt system/question templates
+    prompt = ChatPromptTemplate(messages=[_CHAT_SYSTEM_TEMPLATE, *history_messages, _CHAT_QUESTION_TEMPLATE])
+
+    return prompt | _CHAT_LLM | _CHAT_OUTPUT_PARSER, {"context": context, "question": question}
+
+
+def _clean_chat_response(result: str) -> str:
+    """Turn a chat response into plain text (unwrapping an accidental JSON answer)."""
+    # Check if accidentally returned JSON
+    if result[:1] in _JSON_PREFIXES:
+        try:
+            data = orjson.loads(result)
+            if isinstance(data, dict):
+                result = (
+                    data.get("durumu")
+                    or data.get("yanit")
+                    or " ".join(str(v) for v in data.values() if isinstance(v, str))
+                )
+        except (orjson.JSONDecodeError, KeyError, ValueError):
+            pass
 
-ÖNEMLİ: ASLA JSON, NESNE veya YAPILANDIRILMIŞ VERI KULLANMA!
-Sadece normal konuşma metni ile yanıt ver.
+    return result.strip() if result else "Yanıt alınamadı."
 
-YANIT KURALLARI:
-✓ Normal konuşma dili kullan (sanki birine anlatıyormuş gibi)
-✓ Maksimum 3-4 cümle
-✓ Gerekirse madde işaretleri kullan (•)
-✓ Türkçe yaz
-✗ JSON, dictionary, key-value formatı KULLANMA
-✗ Süslü parantez {{ }} KULLANMA
 
-BAĞLAM:
-{context}""",
-                ),
-                *history_messages,
-                ("user", "{question}"),
-            ]
-        )
+def _chat_error_message(error: Exception) -> str:
+    """User-facing Turkish message for a failed chat turn."""
+    if isinstance(error, TimeoutError):
+        return "Yanıt süresi aşıldı. Lütfen sorunuzu daha kısa tutun ve tekrar deneyin."
+    if isinstance(error, ResourceExhausted):
+        return "Sistem yoğun. Lütfen birkaç saniye bekleyip tekrar deneyin."
 
-        chain = prompt | llm | StrOutputParser()
+    error_msg = str(error)
 
-        try:
-            result = chain.invoke({"context": context, "question": question})
-
-            # Check if accidentally returned JSON
-            if result and (result.startswith("{") or result.startswith("[")):
-                try:
-                    data = json.loads(result)
-                    if isinstance(data, dict):
-                        result = (
-                            data.get("durumu")
-                            or data.get("yanit")
-                            or " ".join(str(v) for v in data.values() if isinstance(v, str))
-                        )
-                except (json.JSONDecodeError, KeyError, ValueError):
-                    pass
-
-            final_result = result.strip() if result else "Yanıt alınamadı."
-            return final_result
-
-        except TimeoutError:
-            return "Yanıt süresi aşıldı. Lütfen sorunuzu daha kısa tutun ve tekrar deneyin."
-        except Exception as e:
-            error_msg = str(e)
-
-            # More specific error messages
-            if "rate_limit" in error_msg.lower() or "quota" in error_msg.lower():
-                return "Sistem yoğun. Lütfen birkaç saniye bekleyip tekrar deneyin."
-            elif "safety" in error_msg.lower() or "blocked" in error_msg.lower():
-                return "Bu soru için yanıt üretilemedi. Lütfen farklı bir şekilde sorun."
-            else:
-                return "Üzgünüm, şu anda yanıt veremiyorum. Lütfen daha sonra tekrar deneyin."
+    # More specific error messages
+    if "safety" in error_msg.lower() or "blocked" in error_msg.lower():
+        return "Bu soru için yanıt üretilemedi. Lütfen farklı bir şekilde sorun."
+    else:
+        return "Üzgünüm, şu anda yanıt veremiyorum. Lütfen daha sonra tekrar deneyin."
@@ -2,11 +2,65 @@
 Pydantic models for structured agent outputs
 """
 
-from typing import List, Optional
-from pydantic import BaseModel, Field
-
-
-class AnswerKeyQuestion(BaseModel):
+from typing import Any, Dict, List
+from pydantic import BaseModel, ConfigDict, Field
+
+
+# JSON schema types -> Gemini schema types
+_SCHEMA_TYPES = {
+    "object": "OBJECT",
+    "array": "ARRAY",
+    "string": "STRING",
+    "number": "NUMBER",
+    "integer": "INTEGER",
+    "boolean": "BOOLEAN",
+}
+
+
+class AgentModel(BaseModel):
+    """Base class for agent models (immutable, unknown LLM fields are dropped)"""
+
+    model_config = ConfigDict(extra="ignore", frozen=True, validate_assignment=False)
+
+    @classmethod
+    def response_schema(cls) -> Dict[str, Any]:
+        """
+        Gemini response_schema for this model (the OpenAPI subset Gemini accepts).
+        $refs are inlined; free-form dict fields are left out since Gemini rejects objects
+        without properties, and validation-only keywords (title, default, bounds) are dropped.
+
+        Returns:
+            Schema dict accepted by GenerationConfig.response_schema
+        """
+        schema = cls.model_json_schema()
+        defs = schema.get("$defs", {})
+
+        def resolve(node: Dict[str, Any]) -> Dict[str, Any]:
+            if "$ref" in node:
+                return {**defs[node["$ref"].rsplit("/", 1)[-1]], **{k: v for k, v in node.items() if k != "$ref"}}
+            return node
+
+        def convert(node: Dict[str, Any]) -> Dict[str, Any]:
+            node = resolve(node)
+            out: Dict[str, Any] = {"type_": _SCHEMA_TYPES[node["type"]]}
+            if "description" in node:
+                out["description"] = node["description"]
+            if node["type"] == "object":
+                properties = {
+                    name: convert(sub)
+                    for name, sub in node.get("properties", {}).items()
+                    if resolve(sub).get("type") != "object" or resolve(sub).get("properties")
+                }
+                out["properties"] = properties
+                out["required"] = [name for name in node.get("required", []) if name in properties]
+            elif node["type"] == "array":
+                out["items"] = convert(node["items"])
+            return out
+
+        return convert(schema)
+
+
+class AnswerKeyQuestion(AgentModel):
     """Structured model for answer key questions"""
 
     number: int = Field(description="Question number")
@@ -16,7 +70,7 @@ class AnswerKeyQuestion(BaseModel):
     keywords: List[str] = Field(default_factory=list, description="Key concepts/terms")
 
 
-class AnswerKeyOutput(BaseModel):
+class AnswerKeyOutput(AgentModel):
     """Complete answer key structure"""
 
     questions: List[AnswerKeyQuestion] = Field(description="List of questions")
@@ -24,20 +78,31 @@ class AnswerKeyOutput(BaseModel):
     max_possible_score: float = Field(description="Sum of all max_scores")
 
 
-class StudentAnswer(BaseModel):
+class StudentAnswer(AgentModel):
     """Student's answer for a question"""
 
     number: int = Field(description="Question number")
     student_answer: str = Field(description="Student's written answer")
 
 
-class StudentAnswersOutput(BaseModel):
+class StudentAnswersOutput(AgentModel):
     """Student answers list"""
 
     answers: List[StudentAnswer] = Field(description="List of student answers")
 
 
-class EvaluationResult(BaseModel):
+class QualityCheckResult(AgentModel):
+    """Result of quality check / self-correction"""
+
+    is_acceptable: bool = Field(description="True if the evaluation quality is acceptable")
+    issues: List[str] = Field(default_factory=list, description="List of quality issues found (if any)")
+    suggested_corrections: Dict[str, Any] = Field(
+        default_factory=dict, description="Suggested corrections if quality is not acceptable"
+    )
+    confidence: float = Field(default=0.9, description="Confidence in the quality assessment")
+
+
+class EvaluationResult(AgentModel):
     """Evaluation result for a single answer with confidence"""
 
     score: float = Field(description="Score awarded (0 to max_score)")
@@ -46,25 +111,26 @@ class EvaluationResult(BaseModel):
     confidence: float = Field(
         default=0.8, ge=0.0, le=1.0, description="Confidence score (0-1) indicating how certain the evaluation is"
     )
-    reasoning: Optional[str] = Field(
-        default=None, description="Brief reasoning for the score (optional, for transparency)"
-    )
+    reasoning: str = Field(default="", description="Brief reasoning for the score (optional, for transparency)")
+    self_check: QualityCheckResult = Field(description="Self-review of this evaluation against the quality criteria")
+    final_score: float = Field(description="Score after the self-review (equals score if no issues were found)")
+
+
+class BulkEvaluationItem(EvaluationResult):
+    """Evaluation result for one question of a bulk evaluation"""
 
+    question_number: int = Field(description="Question number the evaluation belongs to")
 
-class PerformanceAnalysis(BaseModel):
+
+class BulkEvaluationOutput(AgentModel):
+    """Evaluations for several questions graded in one call"""
+
+    evaluations: List[BulkEvaluationItem] = Field(description="One evaluation per question, in input order")
+
+
+class PerformanceAnalysis(AgentModel):
     """Student performance analysis"""
 
     strengths: List[str] = Field(description="2-4 strengths in Turkish (max 15 words each)")
     weaknesses: List[str] = Field(description="2-4 weaknesses in Turkish (max 15 words each)")
     confidence: float = Field(default=0.8, ge=0.0, le=1.0, description="Confidence in the analysis")
-
-
-class QualityCheckResult(BaseModel):
-    """Result of quality check / self-correction"""
-
-    is_acceptable: bool = Field(description="True if the evaluation quality is acceptable")
-    issues: List[str] = Field(default_factory=list, description="List of quality issues found (if any)")
-    suggested_corrections: Optional[dict] = Field(
-        default=None, description="Suggested corrections if quality is not acceptable"
-    )
-    confidence: float = Field(default=0.9, description="Confidence in the quality assessment")
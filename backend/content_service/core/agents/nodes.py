@@ -3,285 +3,444 @@ Agent nodes for LangGraph workflow
 Includes: Reasoning, Tool Execution, Quality Check (Self-Correction)
 """
 
+import asyncio
 import time
-from typing import Literal
-from .state import AgentState
+from dataclasses import fields
+from hashlib import blake2b
+from typing import Any, Callable, Dict, List, Literal, Tuple
+
+import orjson
+
+from libs.settings import settings
+from .state import AgentState, QualityCheckEntry, Task, ToolCallLog
 from .tools import (
     parse_answer_key_tool,
     parse_student_answer_tool,
-    evaluate_answer_tool,
+    evaluate_answers_batch,
     quality_check_tool,
     analyze_performance_tool,
+    build_questions_summary,
 )
 
 
-def agent_reasoning_node(state: AgentState) -> AgentState:
+# Channels merged with operator.add; nodes return only their new entries for these
+_APPEND_FIELDS = frozenset({"thoughts", "actions", "observations", "quality_checks", "tool_call_logs"})
+
+
+def _node_update(state: AgentState, **new_entries: List[Any]) -> Dict[str, Any]:
+    """
+    Build a node's state update: the plain fields as they are now, plus only the
+    entries the node added to the append-reducer lists (flushed once per node).
+    Returning those lists in full would make LangGraph's add reducer re-append
+    entries already in the channel.
+    """
+    update = {f.name: getattr(state, f.name) for f in fields(state) if f.name not in _APPEND_FIELDS}
+    update.update(new_entries)
+    return update
+
+
+def _reason_parse_answer_key(state: AgentState) -> Tuple[str, str]:
+    return (
+        "I need to parse the answer key PDF to extract questions and expected answers.",
+        "use parse_answer_key_tool",
+    )
+
+
+def _reason_parse_student(state: AgentState) -> Tuple[str, str]:
+    return (
+        f"I need to parse student answer sheet. Expected {state.context.get('question_count', 'unknown')} questions.",
+        "use parse_student_answer_tool",
+    )
+
+
+def _reason_evaluate(state: AgentState) -> Tuple[str, str]:
+    retry_count = state.retry_count
+    if retry_count > 0:
+        thought = f"Previous evaluation had quality issues. Retrying with corrections (attempt {retry_count + 1})."
+    else:
+        thought = "I need to evaluate each student answer against the answer key."
+    return thought, "use evaluate_answer_tool for each question"
+
+
+def _reason_analyze(state: AgentState) -> Tuple[str, str]:
+    return (
+        "I need to analyze overall performance and identify strengths/weaknesses.",
+        "use analyze_performance_tool",
+    )
+
+
+# Per-task reasoning, returning (thought, action)
+REASONING_HANDLERS: Dict[Task, Callable[[AgentState], Tuple[str, str]]] = {
+    "parse_answer_key": _reason_parse_answer_key,
+    "parse_student": _reason_parse_student,
+    "evaluate": _reason_evaluate,
+    "analyze": _reason_analyze,
+}
+
+
+def agent_reasoning_node(state: AgentState) -> Dict[str, Any]:
     """
     Agent reasoning node - decides what action to take next.
     This is the "thinking" part of ReAct pattern.
     """
-    task = state["task"]
-    context = state.get("context", {})
-    retry_count = state.get("retry_count", 0)
-
     # Build reasoning based on task
-    if task == "parse_answer_key":
-        thought = "I need to parse the answer key PDF to extract questions and expected answers."
-        action = "use parse_answer_key_tool"
-    elif task == "parse_student":
-        thought = (
-            f"I need to parse student answer sheet. Expected {context.get('question_count', 'unknown')} questions."
-        )
-        action = "use parse_student_answer_tool"
-    elif task == "evaluate":
-        if retry_count > 0:
-            thought = f"Previous evaluation had quality issues. Retrying with corrections (attempt {retry_count + 1})."
-        else:
-            thought = "I need to evaluate each student answer against the answer key."
-        action = "use evaluate_answer_tool for each question"
-    elif task == "analyze":
-        thought = "I need to analyze overall performance and identify strengths/weaknesses."
-        action = "use analyze_performance_tool"
+    handler = REASONING_HANDLERS.get(state.task)
+    if handler is not None:
+        thought, action = handler(state)
     else:
-        thought = "Unknown task"
-        action = "none"
+        thought, action = "Unknown task", "none"
+
+    return _node_update(state, thoughts=[thought], actions=[action])
+
+
+async def _evaluate_pairs(
+    pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+) -> List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any], ToolCallLog]]:
+    """
+    Evaluate (question, student answer) pairs, several questions per Gemini call
+    (see evaluate_answers_batch). Results keep input order; a log's duration_ms is the
+    time until that question's evaluation was ready.
+
+    Returns:
+        List of (question, student_answer, eval_result, tool_call_log) tuples
+    """
+    items = [
+        {
+            "question_number": q["number"],
+            "question_text": q["question_text"],
+            "expected_answer": q["expected_answer"],
+            "student_answer": student_ans["student_answer"],
+            "max_score": q["max_score"],
+            "keywords": q["keywords_joined"] if "keywords_joined" in q else ", ".join(q.get("keywords", [])),
+        }
+        for q, student_ans in pairs
+    ]
+
+    t0 = time.perf_counter_ns()
+    finished_ns = [t0] * len(items)
+
+    def on_result(index: int, _result: Dict[str, Any]) -> None:
+        finished_ns[index] = time.perf_counter_ns()
+
+    eval_results = await evaluate_answers_batch(items, on_result=on_result)
+
+    results = []
+    for (q, student_ans), eval_result, done_ns in zip(pairs, eval_results, finished_ns):
+        log = ToolCallLog(
+            tool="evaluate_answer_tool",
+            question_number=q["number"],
+            duration_ms=round((done_ns - t0) / 1e6, 1),
+            confidence=eval_result.get("confidence", 0.8),
+            timestamp=time.time(),
+        )
+        results.append((q, student_ans, eval_result, log))
+    return results
+
+
+# Evaluations below this confidence count as low confidence (human review signal)
+_LOW_CONFIDENCE = 0.6
+
+
+def _exec_parse_answer_key(state: AgentState, observations: List[str], tool_call_logs: List[ToolCallLog]) -> None:
+    """Parse the answer key PDF"""
+    pdf_text = state.pdf_text
+    intermediate_results = state.intermediate_results
+
+    # Log tool call
+    t0 = time.perf_counter_ns()
+    result = parse_answer_key_tool.invoke({"pdf_text": pdf_text})
+    duration_ms = (time.perf_counter_ns() - t0) / 1e6
+
+    tool_call_logs.append(
+        ToolCallLog(
+            tool="parse_answer_key_tool",
+            duration_ms=round(duration_ms, 1),
+            success="error" not in result,
+            timestamp=time.time(),
+        )
+    )
+
+    intermediate_results["answer_key"] = result
+    observations.append(f"Successfully parsed {result.get('total_questions', 0)} questions from answer key")
+    state.status = "completed"
+    state.final_output = result
+
+
+def _exec_parse_student(state: AgentState, observations: List[str], tool_call_logs: List[ToolCallLog]) -> None:
+    """Parse a student answer sheet PDF"""
+    pdf_text = state.pdf_text
+    context = state.context
+    intermediate_results = state.intermediate_results
+
+    # Log tool call
+    t0 = time.perf_counter_ns()
+    question_count = context.get("question_count", 5)
+    result = parse_student_answer_tool.invoke({"pdf_text": pdf_text, "question_count": question_count})
+    duration_ms = (time.perf_counter_ns() - t0) / 1e6
+
+    tool_call_logs.append(
+        ToolCallLog(
+            tool="parse_student_answer_tool",
+            duration_ms=round(duration_ms, 1),
+            question_count=question_count,
+            answers_found=len(result),
+            timestamp=time.time(),
+        )
+    )
+
+    intermediate_results["student_answers"] = result
+    observations.append(f"Successfully parsed {len(result)} student answers")
+    state.status = "completed"
+    state.final_output = {"answers": result}
+
+
+def _exec_evaluate(state: AgentState, observations: List[str], tool_call_logs: List[ToolCallLog]) -> None:
+    """Evaluate every answered question, then hand off to the quality check"""
+    context = state.context
+    intermediate_results = state.intermediate_results
 
-    state["thoughts"].append(thought)
-    state["actions"].append(action)
+    answer_key = context.get("answer_key", {})
+    student_answers = context.get("student_answers", [])
 
-    return state
+    # Pair each question with the corresponding student answer (first answer per number wins)
+    answers_by_number = {s["number"]: s for s in reversed(student_answers)}
+    pairs = []
+    for q in answer_key.get("questions", []):
+        student_ans = answers_by_number.get(q["number"])
+        if not student_ans:
+            continue
+        pairs.append((q, student_ans))
 
+    # Evaluate all questions, batched into a few concurrent LLM calls
+    results = asyncio.run(_evaluate_pairs(pairs))
 
-def tool_execution_node(state: AgentState) -> AgentState:
+    # Aggregate after gather, in question order
+    evaluations = []
+    for q, student_ans, eval_result, log in results:
+        # Log tool call
+        tool_call_logs.append(log)
+
+        evaluations.append(
+            {
+                "question_number": q["number"],
+                "question_text": q["question_text"],
+                "expected_answer": q["expected_answer"],
+                "student_answer": student_ans["student_answer"],
+                "max_score": q["max_score"],
+                **eval_result,
+            }
+        )
+
+    # Confidence stats for the whole batch in one pass each (C-level builtins, no per-row arithmetic)
+    confidences = [eval_result.get("confidence", 0.8) for _, _, eval_result, _ in results]
+    low_confidence_count = sum(confidence < _LOW_CONFIDENCE for confidence in confidences)
+    state.confidence_scores.extend(confidences)
+    state.confidence_sum += sum(confidences)
+    state.confidence_count += len(confidences)
+    confidence_sum = state.confidence_sum
+    confidence_count = state.confidence_count
+
+    # Check if human review is needed
+    avg_confidence = confidence_sum / confidence_count if confidence_count else 0.8
+    if avg_confidence < _LOW_CONFIDENCE or low_confidence_count > len(evaluations) * 0.3:
+        state.needs_review = True
+        observations.append(f"⚠️ Low confidence detected (avg: {avg_confidence:.2f}). Human review recommended.")
+
+    intermediate_results["evaluations"] = evaluations
+    observations.append(f"Successfully evaluated {len(evaluations)} questions. Avg confidence: {avg_confidence:.2f}")
+    state.status = "quality_check"  # Move to quality check next
+    state.final_output = {"evaluations": evaluations}
+
+
+def _exec_analyze(state: AgentState, observations: List[str], tool_call_logs: List[ToolCallLog]) -> None:
+    """Analyze overall student performance"""
+    context = state.context
+    intermediate_results = state.intermediate_results
+
+    student_name = context.get("student_name", "Unknown")
+    total_score = context.get("total_score", 0)
+    max_score = context.get("max_score", 100)
+    percentage = context.get("percentage", 0)
+    questions_data = context.get("questions_data", [])
+
+    questions_summary = build_questions_summary(questions_data)
+
+    t0 = time.perf_counter_ns()
+    result = analyze_performance_tool.invoke(
+        {
+            "student_name": student_name,
+            "total_score": total_score,
+            "max_score": max_score,
+            "percentage": percentage,
+            "questions_summary": questions_summary,
+        }
+    )
+    duration_ms = (time.perf_counter_ns() - t0) / 1e6
+
+    # Log tool call
+    tool_call_logs.append(
+        ToolCallLog(
+            tool="analyze_performance_tool",
+            duration_ms=round(duration_ms, 1),
+            confidence=result.get("confidence", 0.8),
+            timestamp=time.time(),
+        )
+    )
+
+    # Track confidence
+    if "confidence" in result:
+        state.confidence_scores.append(result["confidence"])
+        state.confidence_sum += result["confidence"]
+        state.confidence_count += 1
+
+    intermediate_results["analysis"] = result
+    observations.append("Successfully analyzed student performance")
+    state.status = "completed"
+    state.final_output = result
+
+
+# Per-task tool execution handlers (O(1) dispatch instead of an if/elif ladder)
+EXEC_HANDLERS: Dict[Task, Callable[[AgentState, List[str], List[ToolCallLog]], None]] = {
+    "parse_answer_key": _exec_parse_answer_key,
+    "parse_student": _exec_parse_student,
+    "evaluate": _exec_evaluate,
+    "analyze": _exec_analyze,
+}
+
+
+def tool_execution_node(state: AgentState) -> Dict[str, Any]:
     """
     Execute tools based on agent's decision.
     This is the "acting" part of ReAct pattern.
 
     NOW WITH TOOL CALL LOGGING!
     """
-    task = state["task"]
-    pdf_text = state.get("pdf_text", "")
-    context = state.get("context", {})
+    task = state.task
+    observations: List[str] = []
+    tool_call_logs: List[ToolCallLog] = []
 
     try:
-        if task == "parse_answer_key":
-            # Log tool call
-            start_time = time.time()
-            result = parse_answer_key_tool.invoke({"pdf_text": pdf_text})
-            duration = time.time() - start_time
-
-            state["tool_call_logs"].append(
-                {
-                    "tool": "parse_answer_key_tool",
-                    "duration_seconds": round(duration, 2),
-                    "success": "error" not in result,
-                    "timestamp": time.time(),
-                }
-            )
+        handler = EXEC_HANDLERS.get(task)
+        if handler is not None:
+            handler(state, observations, tool_call_logs)
+        else:
+            observations.append(f"Unknown task: {task}")
+            state.status = "failed"
+            state.error = f"Unknown task: {task}"
 
-            state["intermediate_results"]["answer_key"] = result
-            state["observations"].append(
-                f"Successfully parsed {result.get('total_questions', 0)} questions from answer key"
-            )
-            state["status"] = "completed"
-            state["final_output"] = result
-
-        elif task == "parse_student":
-            # Log tool call
-            start_time = time.time()
-            question_count = context.get("question_count", 5)
-            result = parse_student_answer_tool.invoke({"pdf_text": pdf_text, "question_count": question_count})
-            duration = time.time() - start_time
-
-            state["tool_call_logs"].append(
-                {
-                    "tool": "parse_student_answer_tool",
-                    "duration_seconds": round(duration, 2),
-                    "question_count": question_count,
-                    "answers_found": len(result),
-                    "timestamp": time.time(),
-                }
-            )
+    except Exception as e:
+        observations.append(f"Error executing task: {str(e)}")
+        state.status = "failed"
+        state.error = str(e)
 
-            state["intermediate_results"]["student_answers"] = result
-            state["observations"].append(f"Successfully parsed {len(result)} student answers")
-            state["status"] = "completed"
-            state["final_output"] = {"answers": result}
-
-        elif task == "evaluate":
-            answer_key = context.get("answer_key", {})
-            student_answers = context.get("student_answers", [])
-
-            evaluations = []
-            low_confidence_count = 0
-
-            for q in answer_key.get("questions", []):
-                # Find corresponding student answer
-                student_ans = next((s for s in student_answers if s["number"] == q["number"]), None)
-                if not student_ans:
-                    continue
-
-                # Evaluate
-                start_time = time.time()
-                eval_result = evaluate_answer_tool.invoke(
-                    {
-                        "question_number": q["number"],
-                        "question_text": q["question_text"],
-                        "expected_answer": q["expected_answer"],
-                        "student_answer": student_ans["student_answer"],
-                        "max_score": q["max_score"],
-                        "keywords": ", ".join(q.get("keywords", [])),
-                    }
-                )
-                duration = time.time() - start_time
-
-                # Log tool call
-                state["tool_call_logs"].append(
-                    {
-                        "tool": "evaluate_answer_tool",
-                        "question_number": q["number"],
-                        "duration_seconds": round(duration, 2),
-                        "confidence": eval_result.get("confidence", 0.8),
-                        "timestamp": time.time(),
-                    }
-                )
+    return _node_update(state, observations=observations, tool_call_logs=tool_call_logs)
 
-                # Track confidence
-                confidence = eval_result.get("confidence", 0.8)
-                state["confidence_scores"].append(confidence)
-
-                # Flag low confidence
-                if confidence < 0.6:
-                    low_confidence_count += 1
-
-                evaluations.append(
-                    {
-                        "question_number": q["number"],
-                        "question_text": q["question_text"],
-                        "expected_answer": q["expected_answer"],
-                        "student_answer": student_ans["student_answer"],
-                        "max_score": q["max_score"],
-                        **eval_result,
-                    }
-                )
 
-            # Check if human review is needed
-            avg_confidence = (
-                sum(state["confidence_scores"]) / len(state["confidence_scores"]) if state["confidence_scores"] else 0.8
-            )
-            if avg_confidence < 0.6 or low_confidence_count > len(evaluations) * 0.3:
-                state["needs_review"] = True
-                state["observations"].append(
-                    f"⚠️ Low confidence detected (avg: {avg_confidence:.2f}). Human review recommended."
-                )
+async def _quality_check_evaluations(
+    evaluations: List[Dict[str, Any]],
+) -> List[Tuple[Dict[str, Any], Dict[str, Any], ToolCallLog]]:
+    """
+    Quality check evaluations concurrently.
+    Concurrency is bounded by settings.EVALUATE_CONCURRENCY; results keep input order.
 
-            state["intermediate_results"]["evaluations"] = evaluations
-            state["observations"].append(
-                f"Successfully evaluated {len(evaluations)} questions. Avg confidence: {avg_confidence:.2f}"
-            )
-            state["status"] = "quality_check"  # Move to quality check next
-            state["final_output"] = {"evaluations": evaluations}
-
-        elif task == "analyze":
-            student_name = context.get("student_name", "Unknown")
-            total_score = context.get("total_score", 0)
-            max_score = context.get("max_score", 100)
-            percentage = context.get("percentage", 0)
-            questions_data = context.get("questions_data", [])
-
-            # Build questions summary
-            questions_summary = "\n\n".join(
-                [
-                    f"Soru {q['question_number']}: {q['score']:.1f}/{q['max_score']:.1f} - "
-                    f"{'Doğru' if q.get('is_correct') else 'Yanlış'}\n"
-                    f"Feedback: {q['feedback'][:150]}..."
-                    for q in questions_data[:10]
-                ]
-            )
+    Returns:
+        List of (eval_data, quality_result, tool_call_log) tuples
+    """
+    semaphore = asyncio.Semaphore(settings.EVALUATE_CONCURRENCY)
 
-            start_time = time.time()
-            result = analyze_performance_tool.invoke(
-                {
-                    "student_name": student_name,
-                    "total_score": total_score,
-                    "max_score": max_score,
-                    "percentage": percentage,
-                    "questions_summary": questions_summary,
-                }
-            )
-            duration = time.time() - start_time
-
-            # Log tool call
-            state["tool_call_logs"].append(
-                {
-                    "tool": "analyze_performance_tool",
-                    "duration_seconds": round(duration, 2),
-                    "confidence": result.get("confidence", 0.8),
-                    "timestamp": time.time(),
-                }
+    async def run(eval_data: Dict[str, Any]):
+        async with semaphore:
+            t0 = time.perf_counter_ns()
+            quality_result = await quality_check_tool.ainvoke(
+                {"evaluation_data": eval_data, "max_score": eval_data.get("max_score", 10)}
             )
+            duration_ms = (time.perf_counter_ns() - t0) / 1e6
+
+        log = ToolCallLog(
+            tool="quality_check_tool",
+            question_number=eval_data.get("question_number"),
+            duration_ms=round(duration_ms, 1),
+            is_acceptable=quality_result.get("is_acceptable", True),
+            timestamp=time.time(),
+        )
+        return eval_data, quality_result, log
 
-            # Track confidence
-            if "confidence" in result:
-                state["confidence_scores"].append(result["confidence"])
+    return await asyncio.gather(*(run(eval_data) for eval_data in evaluations))
 
-            state["intermediate_results"]["analysis"] = result
-            state["observations"].append("Successfully analyzed student performance")
-            state["status"] = "completed"
-            state["final_output"] = result
 
-        else:
-            state["observations"].append(f"Unknown task: {task}")
-            state["status"] = "failed"
-            state["error"] = f"Unknown task: {task}"
+# Evaluations at or above this confidence are accepted without an LLM quality check
+_QUALITY_CHECK_SKIP_CONFIDENCE = 0.9
 
-    except Exception as e:
-        state["observations"].append(f"Error executing task: {str(e)}")
-        state["status"] = "failed"
-        state["error"] = str(e)
 
-    return state
+def _quality_check_key(eval_data: Dict[str, Any]) -> str:
+    """Stable hash of an evaluation (and its max score) for the quality check cache."""
+    payload = orjson.dumps(eval_data, option=orjson.OPT_SORT_KEYS)
+    return f"{blake2b(payload).hexdigest()}:{eval_data.get('max_score', 10)}"
 
 
-def quality_check_node(state: AgentState) -> AgentState:
+def quality_check_node(state: AgentState) -> Dict[str, Any]:
     """
     NEW NODE: Quality check / self-correction node.
     Reviews evaluation results and decides if they're acceptable or need retry.
     """
-    evaluations = state["intermediate_results"].get("evaluations", [])
-    retry_count = state.get("retry_count", 0)
+    evaluations = state.intermediate_results.get("evaluations", [])
+    retry_count = state.retry_count
     max_retries = 2
+    observations: List[str] = []
+    tool_call_logs: List[ToolCallLog] = []
+    quality_checks: List[QualityCheckEntry] = []
 
     if not evaluations or retry_count >= max_retries:
         # Skip quality check if no evaluations or max retries reached
-        state["status"] = "completed"
-        state["observations"].append("Quality check skipped (no evaluations or max retries reached)")
-        return state
+        state.status = "completed"
+        observations.append("Quality check skipped (no evaluations or max retries reached)")
+        return _node_update(state, observations=observations)
 
     # Perform quality check on evaluations
     quality_issues = []
     needs_retry = False
 
-    for eval_data in evaluations:
-        start_time = time.time()
-        quality_result = quality_check_tool.invoke(
-            {"evaluation_data": eval_data, "max_score": eval_data.get("max_score", 10)}
-        )
-        duration = time.time() - start_time
+    # Only evaluations not checked before (new or changed on retry) go to the LLM;
+    # high-confidence ones, and ones the evaluator already self-checked (unless low confidence),
+    # are accepted as-is
+    qc_cache = state.quality_check_cache
+    keys = [_quality_check_key(eval_data) for eval_data in evaluations]
+    pending = {}
+    for key, eval_data in zip(keys, evaluations):
+        if key in qc_cache:
+            continue
+        confidence = eval_data.get("confidence", 0.8)
+        if confidence >= _QUALITY_CHECK_SKIP_CONFIDENCE or (
+            "self_check" in eval_data and confidence >= _LOW_CONFIDENCE
+        ):
+            qc_cache[key] = {"is_acceptable": True, "issues": []}
+            tool_call_logs.append(
+                ToolCallLog(
+                    tool="quality_check_tool",
+                    question_number=eval_data.get("question_number"),
+                    skipped=True,
+                    timestamp=time.time(),
+                )
+            )
+        else:
+            pending.setdefault(key, eval_data)
+
+    # Check pending evaluations concurrently (independent LLM calls)
+    results = asyncio.run(_quality_check_evaluations(list(pending.values())))
 
+    for key, (_, quality_result, log) in zip(pending, results):
         # Log quality check
-        state["tool_call_logs"].append(
-            {
-                "tool": "quality_check_tool",
-                "question_number": eval_data.get("question_number"),
-                "duration_seconds": round(duration, 2),
-                "is_acceptable": quality_result.get("is_acceptable", True),
-                "timestamp": time.time(),
-            }
-        )
+        tool_call_logs.append(log)
+        qc_cache[key] = quality_result
+
+    # Aggregate in question order
+    for key, eval_data in zip(keys, evaluations):
+        quality_result = qc_cache[key]
 
         # Store quality check result
-        state["quality_checks"].append({"question_number": eval_data.get("question_number"), "result": quality_result})
+        quality_checks.append(
+            QualityCheckEntry(question_number=eval_data.get("question_number"), result=quality_result)
+        )
 
         if not quality_result.get("is_acceptable", True):
             needs_retry = True
@@ -289,28 +448,28 @@ def quality_check_node(state: AgentState) -> AgentState:
 
     if needs_retry and retry_count < max_retries:
         # Retry evaluation with corrections
-        state["retry_count"] = retry_count + 1
-        state["status"] = "processing"
-        state["observations"].append(
+        state.retry_count = retry_count + 1
+        state.status = "processing"
+        observations.append(
             f"Quality check found issues. Retrying evaluation (attempt {retry_count + 2}/{max_retries + 1})"
         )
-        state["observations"].append(f"Issues found: {', '.join(quality_issues[:3])}")
+        observations.append(f"Issues found: {', '.join(quality_issues[:3])}")
 
         # Loop back to tool_execution for retry
         # Note: The graph will handle this via conditional edges
     else:
         # Quality check passed or max retries reached
         if needs_retry:
-            state["observations"].append(
+            observations.append(
                 f"⚠️ Quality issues persist after {max_retries} retries. Proceeding with current results."
             )
-            state["needs_review"] = True
+            state.needs_review = True
         else:
-            state["observations"].append("✅ Quality check passed. All evaluations are acceptable.")
+            observations.append("✅ Quality check passed. All evaluations are acceptable.")
 
-        state["status"] = "completed"
+        state.status = "completed"
 
-    return state
+    return _node_update(state, observations=observations, tool_call_logs=tool_call_logs, quality_checks=quality_checks)
 
 
 def should_continue_after_execution(state: AgentState) -> Literal["quality_check", "end"]:
@@ -319,7 +478,7 @@ def should_continue_after_execution(state: AgentState) -> Literal["quality_check
     - If evaluation task → go to quality_check
     - Otherwise → end
     """
-    if state["status"] == "quality_check" and state["task"] == "evaluate":
+    if state.status == "quality_check" and state.task == "evaluate":
         return "quality_check"
     return "end"
 
@@ -330,6 +489,6 @@ def should_retry_after_quality_check(state: AgentState) -> Literal["retry", "end
     - If retry needed and within limits → retry (go back to reasoning)
     - Otherwise → end
     """
-    if state["status"] == "processing" and state.get("retry_count", 0) > 0:
+    if state.status == "processing" and state.retry_count > 0:
         return "retry"
     return "end"
@@ -2,39 +2,76 @@
 Agent state definition for LangGraph
 """
 
-from typing import Dict, Any, List, TypedDict, Annotated
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Annotated, Literal, Optional
 from operator import add
 
+Task = Literal["parse_answer_key", "parse_student", "evaluate", "analyze"]
 
-class AgentState(TypedDict):
+
+@dataclass(slots=True, kw_only=True)
+class ToolCallLog:
+    """
+    One tool call in the agent trace.
+    Only the fields relevant to the tool are set; the rest stay None.
+    """
+
+    tool: str
+    timestamp: float
+    duration_ms: Optional[float] = None
+    question_number: Optional[int] = None
+    success: Optional[bool] = None
+    confidence: Optional[float] = None
+    is_acceptable: Optional[bool] = None
+    question_count: Optional[int] = None
+    answers_found: Optional[int] = None
+    skipped: Optional[bool] = None
+
+
+@dataclass(slots=True)
+class QualityCheckEntry:
+    """Quality check result for one evaluated question"""
+
+    question_number: Optional[int]
+    result: Dict[str, Any]
+
+
+@dataclass(slots=True)
+class AgentState:
     """
     State for the exam evaluation agent.
     This state is passed through all nodes in the graph.
+
+    LangGraph builds an instance from its channels before each node runs, so nodes
+    use slotted attribute access (state.thoughts) instead of dict lookups.
     """
 
     # Input data
-    task: str  # Current task: "parse_answer_key", "parse_student", "evaluate", "analyze"
-    pdf_text: str  # PDF content to process
-    context: Dict[str, Any]  # Additional context (answer key, student data, etc.)
+    task: Task  # Current task
+    pdf_text: str = ""  # PDF content to process
+    context: Dict[str, Any] = field(default_factory=dict)  # Additional context (answer key, student data, etc.)
 
     # Agent reasoning (accumulated across nodes)
-    thoughts: Annotated[List[str], add]  # Agent's reasoning steps
-    actions: Annotated[List[str], add]  # Actions taken
-    observations: Annotated[List[str], add]  # Observations from actions
+    thoughts: Annotated[List[str], add] = field(default_factory=list)  # Agent's reasoning steps
+    actions: Annotated[List[str], add] = field(default_factory=list)  # Actions taken
+    observations: Annotated[List[str], add] = field(default_factory=list)  # Observations from actions
 
     # Tool outputs
-    intermediate_results: Dict[str, Any]  # Results from tools
+    intermediate_results: Dict[str, Any] = field(default_factory=dict)  # Results from tools
 
     # Quality control
-    quality_checks: Annotated[List[Dict[str, Any]], add]  # Quality check results
-    retry_count: int  # Number of retries attempted
-    needs_review: bool  # Flag for human review (low confidence)
+    quality_checks: Annotated[List[QualityCheckEntry], add] = field(default_factory=list)  # Quality check results
+    retry_count: int = 0  # Number of retries attempted
+    needs_review: bool = False  # Flag for human review (low confidence)
+    quality_check_cache: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # Evaluation hash -> QC result
 
     # Final output
-    final_output: Dict[str, Any]  # Final result
-    status: str  # "processing", "completed", "failed", "needs_review"
-    error: str  # Error message if failed
+    final_output: Dict[str, Any] = field(default_factory=dict)  # Final result
+    status: str = "processing"  # "processing", "completed", "failed", "needs_review"
+    error: str = ""  # Error message if failed
 
     # Metadata for tracking
-    confidence_scores: List[float]  # Track confidence across evaluations
-    tool_call_logs: Annotated[List[Dict[str, Any]], add]  # Log of all tool calls
+    confidence_scores: List[float] = field(default_factory=list)  # Track confidence across evaluations
+    confidence_sum: float = 0.0  # Running sum of confidence_scores (O(1) average)
+    confidence_count: int = 0  # Running count of confidence_scores
+    tool_call_logs: Annotated[List[ToolCallLog], add] = field(default_factory=list)  # Log of all tool calls
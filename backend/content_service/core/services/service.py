@@ -1,5 +1,7 @@
+import asyncio
 import uuid
 import base64
+from typing import AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import UploadFile
 
@@ -416,52 +418,15 @@ class ContentService:
             AI response text
         """
         try:
-            from libs.models.exam import QuestionResponse, FollowUpQuestion
-
-            # Get student response with evaluation for authorization
-            result = await self.db.execute(
-                select(StudentResponse)
-                .join(Evaluation, StudentResponse.evaluation_id == Evaluation.id)
-                .where(StudentResponse.id == student_response_id, Evaluation.user_id == user_id)
-            )
-            student = result.scalar_one_or_none()
-
-            if not student:
-                raise ExceptionBase(ErrorCode.NOT_FOUND)
-
-            # Get evaluation
-            result = await self.db.execute(select(Evaluation).where(Evaluation.id == student.evaluation_id))
-            evaluation = result.scalar_one_or_none()
-
-            # Get all question responses
-            result = await self.db.execute(
-                select(QuestionResponse)
-                .where(QuestionResponse.student_response_id == student_response_id)
-                .order_by(QuestionResponse.question_number)
-            )
-            question_responses = result.scalars().all()
-
-            # Build questions data for context
-            questions_data = []
-            for qr in question_responses:
-                additional_data = qr.additional_data or {}
-                questions_data.append(
-                    {
-                        "number": qr.question_number,
-                        "expected_answer": qr.expected_answer,
-                        "student_answer": qr.student_answer,
-                        "score": qr.score,
-                        "max_score": qr.max_score,
-                        "feedback": qr.feedback,
-                        "is_correct": additional_data.get("is_correct", False),
-                    }
-                )
+            student, evaluation, questions_data = await self._load_chat_context(student_response_id, user_id)
 
             # Call Agent for chat
             from content_service.core.agents import ExamEvaluationAgent
 
             agent = ExamEvaluationAgent()
-            ai_response = agent.chat_about_student(
+            # The chat call is a blocking Gemini round trip; run it off the event loop
+            ai_response = await asyncio.to_thread(
+                agent.chat_about_student,
                 question=question,
                 student_name=student.student_name or "Unknown",
                 total_score=student.total_score,
@@ -472,22 +437,7 @@ class ContentService:
                 chat_history=chat_history,
             )
 
-            # Save to database
-            followup = FollowUpQuestion(
-                evaluation_id=evaluation.id,
-                user_id=user_id,
-                student_response_id=student_response_id,
-                question=question,
-                answer=ai_response,
-                context={
-                    "student_id": student.student_id,
-                    "student_name": student.student_name,
-                    "total_score": student.total_score,
-                    "percentage": student.percentage,
-                },
-            )
-            self.db.add(followup)
-            await self.db.commit()
+            await self._save_followup(student, evaluation, user_id, question, ai_response)
 
             return ai_response
 
@@ -495,3 +445,121 @@ class ContentService:
             raise
         except Exception:
             raise ExceptionBase(ErrorCode.INTERNAL_SERVER_ERROR)
+
+    async def stream_chat_with_student_context(
+        self, student_response_id: int, question: str, chat_history: list, user_id: int
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of chat_with_student_context.
+        Authorization and context loading happen before this returns, so their errors still reach
+        the client as HTTP errors; the chat is saved to FollowUpQuestion once the stream completes.
+
+        Args:
+            student_response_id: Student response ID
+            question: User's question
+            chat_history: Previous messages [{"role": "user/assistant", "content": "..."}]
+            user_id: User ID (for authorization)
+
+        Returns:
+            Async iterator over the AI response text chunks
+        """
+        try:
+            student, evaluation, questions_data = await self._load_chat_context(student_response_id, user_id)
+        except ExceptionBase:
+            raise
+        except Exception:
+            raise ExceptionBase(ErrorCode.INTERNAL_SERVER_ERROR)
+
+        from content_service.core.agents import ExamEvaluationAgent
+
+        agent = ExamEvaluationAgent()
+
+        async def stream() -> AsyncIterator[str]:
+            chunks = []
+            async for chunk in agent.stream_chat_about_student(
+                question=question,
+                student_name=student.student_name or "Unknown",
+                total_score=student.total_score,
+                max_score=student.max_score,
+                percentage=student.percentage,
+                summary=student.summary or "",
+                questions_data=questions_data,
+                chat_history=chat_history,
+            ):
+                chunks.append(chunk)
+                yield chunk
+
+            await self._save_followup(student, evaluation, user_id, question, "".join(chunks).strip())
+
+        return stream()
+
+    async def _load_chat_context(self, student_response_id: int, user_id: int):
+        """
+        Load the student (authorized through its evaluation), the evaluation and the per-question
+        context passed to the chat.
+
+        Returns:
+            (student, evaluation, questions_data)
+        """
+        from libs.models.exam import QuestionResponse
+
+        # Get student response with evaluation for authorization
+        result = await self.db.execute(
+            select(StudentResponse)
+            .join(Evaluation, StudentResponse.evaluation_id == Evaluation.id)
+            .where(StudentResponse.id == student_response_id, Evaluation.user_id == user_id)
+        )
+        student = result.scalar_one_or_none()
+
+        if not student:
+            raise ExceptionBase(ErrorCode.NOT_FOUND)
+
+        # Get evaluation
+        result = await self.db.execute(select(Evaluation).where(Evaluation.id == student.evaluation_id))
+        evaluation = result.scalar_one_or_none()
+
+        # Get all question responses
+        result = await self.db.execute(
+            select(QuestionResponse)
+            .where(QuestionResponse.student_response_id == student_response_id)
+            .order_by(QuestionResponse.question_number)
+        )
+        question_responses = result.scalars().all()
+
+        # Build questions data for context
+        questions_data = []
+        for qr in question_responses:
+            additional_data = qr.additional_data or {}
+            questions_data.append(
+                {
+                    "number": qr.question_number,
+                    "expected_answer": qr.expected_answer,
+                    "student_answer": qr.student_answer,
+                    "score": qr.score,
+                    "max_score": qr.max_score,
+                    "feedback": qr.feedback,
+                    "is_correct": additional_data.get("is_correct", False),
+                }
+            )
+
+        return student, evaluation, questions_data
+
+    async def _save_followup(self, student, evaluation, user_id: int, question: str, answer: str) -> None:
+        """Save a chat turn to the FollowUpQuestion model."""
+        from libs.models.exam import FollowUpQuestion
+
+        followup = FollowUpQuestion(
+            evaluation_id=evaluation.id,
+            user_id=user_id,
+            student_response_id=student.id,
+            question=question,
+            answer=answer,
+            context={
+                "student_id": student.student_id,
+                "student_name": student.student_name,
+                "total_score": student.total_score,
+                "percentage": student.percentage,
+            },
+        )
+        self.db.add(followup)
+        await self.db.commit()
@@ -1,14 +1,22 @@
+import asyncio
 import base64
 import io
 from pypdf import PdfReader
 from content_service.core.worker.config import celery_app
-from content_service.core.agents import ExamEvaluationAgent, evaluate_answer_tool
+from celery.signals import worker_process_init
+from content_service.core.agents import ExamEvaluationAgent, evaluate_answers_batch, warmup
 from libs.db.db import get_db_session_sync
 from libs.models.exam import Evaluation, EvaluationStatus, StudentResponse, QuestionResponse
 from libs.cache.progress_tracker import ProgressTracker
 from sqlalchemy import select
 
 
+@worker_process_init.connect
+def warmup_worker(**_kwargs):
+    """Open the Gemini channels in each forked worker process before it takes tasks."""
+    warmup()
+
+
 @celery_app.task(
     name="process_answer_key",
     bind=True,
@@ -262,14 +270,13 @@ def process_student_answer_task(self, student_response_id: int, evaluation_id: s
 
             # Step 3: Create QuestionResponse records for each question
             answer_key_questions = evaluation.answer_key_data.get("questions", [])
+            # Index student answers by number once (first answer per number wins)
+            student_answer_map = {q.get("number"): q for q in reversed(student_answers)}
 
             for answer_key_q in answer_key_questions:
                 # Find matching student answer
-                student_answer_text = None
-                for student_q in student_answers:
-                    if student_q.get("number") == answer_key_q.get("number"):
-                        student_answer_text = student_q.get("student_answer", "")
-                        break
+                student_q = student_answer_map.get(answer_key_q.get("number"))
+                student_answer_text = student_q.get("student_answer", "") if student_q else None
 
                 if not student_answer_text:
                     student_answer_text = "[No answer provided]"
@@ -383,46 +390,61 @@ def evaluate_student_responses_task(self, student_response_id: int, evaluation_i
                 evaluated_questions=0,
             )
 
-            # Evaluate each question
-            for idx, qr in enumerate(question_responses, 1):
+            # Evaluate all questions concurrently (independent Gemini calls)
+            targets = []
+            items = []
+            for qr in question_responses:
                 # Get answer key for this question
                 answer_key = answer_key_map.get(qr.question_number)
                 if not answer_key:
                     continue
 
-                # Evaluate with Agent Tool
-                evaluation_result = evaluate_answer_tool.invoke(
+                targets.append(qr)
+                items.append(
                     {
                         "question_number": qr.question_number,
                         "question_text": answer_key.get("question_text", ""),
                         "expected_answer": qr.expected_answer,
                         "student_answer": qr.student_answer,
                         "max_score": qr.max_score,
-                        "keywords": ", ".join(answer_key.get("keywords", [])),
+                        "keywords": (
+                            answer_key["keywords_joined"]
+                            if "keywords_joined" in answer_key
+                            else ", ".join(answer_key.get("keywords", []))
+                        ),
                     }
                 )
 
-                # Update QuestionResponse
-                qr.score = evaluation_result["score"]
-                qr.feedback = evaluation_result["feedback"]
-                qr.additional_data = {
-                    "is_correct": evaluation_result.get("is_correct", False),
-                }
+            evaluated = 0
 
-                total_score += evaluation_result["score"]
+            def on_result(index, evaluation_result):
+                nonlocal evaluated
+                evaluated += 1
 
-                # Update progress after each question (0-70% range for questions)
-                question_progress = (idx / total_questions) * 70.0
+                # Update progress as each question finishes (0-70% range for questions)
+                question_progress = (evaluated / total_questions) * 70.0
                 ProgressTracker.set_student_progress(
                     student_response_id=student_response_id,
                     evaluation_id=evaluation_id,
                     percentage=question_progress,
-                    message=f"Evaluated question {idx}/{total_questions}",
+                    message=f"Evaluated question {evaluated}/{total_questions}",
                     status="processing",
                     total_questions=total_questions,
-                    evaluated_questions=idx,
+                    evaluated_questions=evaluated,
                 )
 
+            evaluation_results = asyncio.run(evaluate_answers_batch(items, on_result=on_result))
+
+            for qr, evaluation_result in zip(targets, evaluation_results):
+                # Update QuestionResponse
+                qr.score = evaluation_result["score"]
+                qr.feedback = evaluation_result["feedback"]
+                qr.additional_data = {
+                    "is_correct": evaluation_result.get("is_correct", False),
+                }
+
+                total_score += evaluation_result["score"]
+
             # Update student response with final score
             student_response.total_score = total_score
             # Status is "completed" when total_score > 0 and summary exists
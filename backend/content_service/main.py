@@ -12,6 +12,7 @@ from sentry_sdk.integrations.fastapi import FastApiIntegration
 from sentry_sdk.integrations.starlette import StarletteIntegration
 
 from content_service.api.v1.content.router import router as content_router
+from content_service.core.agents import warmup
 from libs import ExceptionBase, settings
 
 
@@ -41,6 +42,9 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
     redis_instance = redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
     await FastAPILimiter.init(redis_instance)
 
+    # Open the Gemini channels before the first request (off the event loop, it may wait on the network)
+    await anyio.to_thread.run_sync(warmup)
+
     yield
 
     # Close Redis connection on shutdown
@@ -54,6 +58,7 @@ app = FastAPI(
     openapi_url=f"{settings.API_STR}/openapi.json",
     swagger_ui_parameters={"defaultModelsExpandDepth": -1},
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Middleware settings
@@ -0,0 +1,215 @@
+"""
+LLM response cache.
+
+Caches structured LLM outputs (JSON-serializable dicts) by a hash of their inputs,
+so identical requests (re-grading, retries) skip the LLM round-trip entirely.
+Lookups go through a bounded in-process LRU first, then Redis. Both levels hold the
+encoded JSON, so every hit returns a fresh copy that callers are free to mutate.
+The async variants serve LRU hits inline and run only the blocking Redis round-trips
+in a thread pool, so cache I/O never stalls an event loop that is driving LLM calls.
+With settings.LLM_CACHE_ENABLED off every lookup misses and nothing is stored.
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+from typing import Any, Dict, List, Optional
+
+import orjson
+import redis
+
+from libs.cache.cache import CacheService
+from libs.settings import settings
+
+
+class LLMResponseCache:
+    """Two-level (in-process LRU + Redis) cache for LLM tool results."""
+
+    _local: "OrderedDict[str, bytes]" = OrderedDict()
+    _lock = threading.Lock()
+    # Sized to the Gemini concurrency cap so cache round-trips never queue behind each other
+    _executor = ThreadPoolExecutor(max_workers=settings.GEMINI_MAX_CONCURRENCY, thread_name_prefix="llm-cache")
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        Build a cache key from the inputs that determine an LLM result.
+
+        Args:
+            parts: Input values (joined with "|" before hashing)
+
+        Returns:
+            Hex digest of the joined inputs
+        """
+        return blake2b("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def versioned(namespace: str, *parts: Any) -> str:
+        """
+        Tag a namespace with a short hash of what shapes its results (prompt text, output schema, model).
+        Editing any part moves the namespace, so stale results are never read again and just expire.
+
+        Args:
+            namespace: Base namespace (usually the tool name)
+            parts: Values the cached results depend on besides the per-call inputs
+
+        Returns:
+            Namespace of the form "<namespace>:<8 hex chars>"
+        """
+        return f"{namespace}:{LLMResponseCache.make_key(*parts)[:8]}"
+
+    @staticmethod
+    def _get_key(namespace: str, key: str) -> str:
+        """Generate Redis key for a cached LLM result."""
+        return f"llm_cache:{namespace}:{key}"
+
+    @staticmethod
+    def get(namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached result.
+
+        Args:
+            namespace: Cache namespace (usually the tool name)
+            key: Key from make_key
+
+        Returns:
+            Fresh copy of the cached result or None on a miss
+        """
+        if not settings.LLM_CACHE_ENABLED:
+            return None
+
+        redis_key = LLMResponseCache._get_key(namespace, key)
+        data = LLMResponseCache._get_local(redis_key)
+        if data is None:
+            data = LLMResponseCache._get_remote(redis_key)
+        return None if data is None else orjson.loads(data)
+
+    @staticmethod
+    async def aget(namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        """Async get (see get); only a local miss leaves the event loop."""
+        if not settings.LLM_CACHE_ENABLED:
+            return None
+
+        redis_key = LLMResponseCache._get_key(namespace, key)
+        data = LLMResponseCache._get_local(redis_key)
+        if data is None:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(LLMResponseCache._executor, LLMResponseCache._get_remote, redis_key)
+        return None if data is None else orjson.loads(data)
+
+    @staticmethod
+    def get_many(namespace: str, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Get several cached results, with one Redis round-trip for all local misses.
+
+        Args:
+            namespace: Cache namespace (usually the tool name)
+            keys: Keys from make_key
+
+        Returns:
+            Fresh copy of each cached result (None on a miss), in key order
+        """
+        if not settings.LLM_CACHE_ENABLED:
+            return [None] * len(keys)
+
+        redis_keys = [LLMResponseCache._get_key(namespace, key) for key in keys]
+        found = [LLMResponseCache._get_local(redis_key) for redis_key in redis_keys]
+        missing = [index for index, data in enumerate(found) if data is None]
+
+        if missing:
+            try:
+                remote = CacheService.client.mget([redis_keys[index] for index in missing])
+            except redis.RedisError:
+                # Cache is best effort; a Redis outage must not fail the evaluation
+                remote = [None] * len(missing)
+            for index, data in zip(missing, remote):
+                if data:
+                    LLMResponseCache._remember(redis_keys[index], data)
+                    found[index] = data
+
+        return [None if data is None else orjson.loads(data) for data in found]
+
+    @staticmethod
+    async def aget_many(namespace: str, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Async get_many, run in the cache's thread pool."""
+        if not settings.LLM_CACHE_ENABLED:
+            return [None] * len(keys)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(LLMResponseCache._executor, LLMResponseCache.get_many, namespace, keys)
+
+    @staticmethod
+    def set(namespace: str, key: str, value: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        """
+        Store a result.
+
+        Args:
+            namespace: Cache namespace (usually the tool name)
+            key: Key from make_key
+            value: JSON-serializable result
+            ttl: Time-to-live in seconds (default settings.LLM_CACHE_TTL)
+        """
+        if not settings.LLM_CACHE_ENABLED:
+            return
+
+        redis_key = LLMResponseCache._get_key(namespace, key)
+        data = orjson.dumps(value)
+        LLMResponseCache._remember(redis_key, data)
+        LLMResponseCache._set_remote(redis_key, data, ttl or settings.LLM_CACHE_TTL)
+
+    @staticmethod
+    async def aset(namespace: str, key: str, value: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        """Async set (see set); the Redis write runs in the cache's thread pool."""
+        if not settings.LLM_CACHE_ENABLED:
+            return
+
+        redis_key = LLMResponseCache._get_key(namespace, key)
+        data = orjson.dumps(value)
+        LLMResponseCache._remember(redis_key, data)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            LLMResponseCache._executor, LLMResponseCache._set_remote, redis_key, data, ttl or settings.LLM_CACHE_TTL
+        )
+
+    @staticmethod
+    def _get_local(redis_key: str) -> Optional[bytes]:
+        """Look up the in-process LRU, marking a hit as most recently used."""
+        with LLMResponseCache._lock:
+            data = LLMResponseCache._local.get(redis_key)
+            if data is not None:
+                LLMResponseCache._local.move_to_end(redis_key)
+        return data
+
+    @staticmethod
+    def _get_remote(redis_key: str) -> Optional[bytes]:
+        """Look up Redis (blocking), remembering a hit in the LRU."""
+        try:
+            data = CacheService.client.get(redis_key)
+        except redis.RedisError:
+            # Cache is best effort; a Redis outage must not fail the evaluation
+            return None
+
+        if not data:
+            return None
+
+        LLMResponseCache._remember(redis_key, data)
+        return data
+
+    @staticmethod
+    def _set_remote(redis_key: str, data: bytes, ttl: int) -> None:
+        """Write to Redis (blocking)."""
+        try:
+            CacheService.client.setex(redis_key, ttl, data)
+        except redis.RedisError:
+            pass
+
+    @staticmethod
+    def _remember(redis_key: str, data: bytes) -> None:
+        """Insert into the in-process LRU, evicting the least recently used entry when full."""
+        with LLMResponseCache._lock:
+            LLMResponseCache._local[redis_key] = data
+            LLMResponseCache._local.move_to_end(redis_key)
+            if len(LLMResponseCache._local) > settings.LLM_CACHE_MAXSIZE:
+                LLMResponseCache._local.popitem(last=False)
@@ -5,7 +5,7 @@ This module provides functions to track task progress in Redis,
 allowing SSE endpoints to stream updates to clients.
 """
 
-import json
+import orjson
 from typing import Dict, Any, Optional
 from libs.cache.cache import CacheService
 
@@ -52,7 +52,7 @@ class ProgressTracker:
         }
 
         # Use raw Redis client (no encryption for progress tracking)
-        CacheService.client.setex(key, ttl, json.dumps(progress_data))
+        CacheService.client.setex(key, ttl, orjson.dumps(progress_data))
 
     @staticmethod
     def get_progress(task_type: str, task_id: str) -> Optional[Dict[str, Any]]:
@@ -71,10 +71,8 @@ class ProgressTracker:
         data = CacheService.client.get(key)
 
         if data:
-            # Redis returns bytes, decode to string
-            if isinstance(data, bytes):
-                data = data.decode("utf-8")
-            return json.loads(data)
+            # orjson parses the raw bytes Redis returns directly
+            return orjson.loads(data)
         return None
 
     @staticmethod
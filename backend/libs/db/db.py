@@ -1,6 +1,7 @@
 from contextlib import asynccontextmanager, contextmanager
 from typing import Any, AsyncGenerator, Generator, Union
 
+import orjson
 from sqlalchemy import create_engine
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
@@ -34,6 +35,12 @@ else:
         f"{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
     )
 
+
+def _json_serializer(value: Any) -> str:
+    """Serialize JSON columns (answer key data, agent traces) with orjson instead of stdlib json."""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+
 # Engine configurations
 async_engine = create_async_engine(
     ASYNC_DATABASE_URL,
@@ -46,6 +53,8 @@ async_engine = create_async_engine(
     echo_pool=False,
     future=True,
     connect_args={"ssl": False},  # Disable SSL for asyncpg
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
 )
 
 sync_engine = create_engine(
@@ -58,6 +67,8 @@ sync_engine = create_engine(
     echo=False,
     echo_pool=False,
     connect_args={"sslmode": "disable"},  # Disable SSL for psycopg2
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
 )
 
 # Session factories
@@ -0,0 +1,169 @@
+"""
+Client-side rate limiting for LLM calls.
+
+A token bucket paces requests (RPM) and estimated tokens (TPM) so calls that fit the
+minute budget go out immediately and only calls that would exceed it wait.
+The bucket is shared by every thread and event loop in the process.
+A circuit breaker fails calls fast while the provider keeps rejecting them.
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple, Type
+
+
+class TokenBucket:
+    """Requests-per-minute + tokens-per-minute limiter (thread-safe, event-loop agnostic)."""
+
+    def __init__(self, rpm: int, tpm: int, per: float = 60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.per = per
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        """
+        Debit one request and `tokens` tokens, refilling for the time elapsed since the last call.
+        Balances may go negative; the deficit is the reservation later callers queue behind.
+
+        Returns:
+            Seconds to wait before the call may be sent
+        """
+        tokens = min(tokens, self.tpm)
+
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / self.per)
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / self.per)
+            self._requests -= 1
+            self._tokens -= tokens
+
+            return max(0.0, -self._requests * self.per / self.rpm, -self._tokens * self.per / self.tpm)
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        Wait (without blocking the event loop) until the request fits the budget.
+
+        Args:
+            tokens: Estimated input + output tokens of the request
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: int = 0) -> None:
+        """
+        Block until the request fits the budget (for sync callers and worker threads).
+
+        Args:
+            tokens: Estimated input + output tokens of the request
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+
+def estimate_tokens(*texts: str, max_output: int = 0) -> int:
+    """Rough token estimate for a request: ~4 characters per input token plus the output budget."""
+    return sum(len(text) for text in texts) // 4 + max_output
+
+
+class ConcurrencyLimit:
+    """
+    Cap on in-flight async calls.
+    asyncio.Semaphore is bound to one event loop and the sync tools start a fresh loop per
+    asyncio.run, so one semaphore is kept per running loop (dropped once the loop is closed).
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                # A semaphore keeps its loop alive once it has blocked, so closed loops are pruned here
+                for closed in [other for other in self._semaphores if other.is_closed()]:
+                    del self._semaphores[closed]
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+            return semaphore
+
+    async def __aenter__(self) -> None:
+        await self._semaphore().acquire()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._semaphore().release()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a call while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast after repeated failures of a dependency (thread-safe, event-loop agnostic).
+    After `fail_max` consecutive failures the circuit opens for `reset_timeout` seconds; then one
+    trial call is let through and its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, fail_max: int, reset_timeout: float, failure_types: Tuple[Type[BaseException], ...]):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.failure_types = failure_types
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def _allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        Run the enclosed call under the breaker; only `failure_types` count as failures,
+        any other outcome means the dependency answered and closes the circuit.
+
+        Raises:
+            CircuitOpenError: The circuit is open (nothing inside the block is run)
+        """
+        if not self._allow():
+            raise CircuitOpenError(f"Circuit open after {self.fail_max} consecutive failures")
+        try:
+            yield
+        except self.failure_types:
+            with self._lock:
+                self._trial = False
+                self._failures += 1
+                if self._failures >= self.fail_max:
+                    self._opened_at = time.monotonic()
+            raise
+        except BaseException as error:
+            with self._lock:
+                self._trial = False
+                if isinstance(error, Exception):
+                    self._failures = 0
+                    self._opened_at = None
+            raise
+        else:
+            with self._lock:
+                self._trial = False
+                self._failures = 0
+                self._opened_at = None
@@ -41,6 +41,21 @@ class Config(BaseSettings):
 
     # GEMINI (Google)
     GEMINI_API_KEY: str
+    GEMINI_MODEL_EXTRACT: str = "gemini-2.0-flash-lite"  # Verbatim PDF parsing (answer keys, student sheets)
+    GEMINI_MODEL_JUDGE: str = "gemini-2.0-flash-exp"  # Grading, quality checks and performance analysis
+    EVALUATE_CONCURRENCY: int = 8  # Max concurrent per-question evaluations within one student
+    LLM_CACHE_ENABLED: bool = True  # Off: every LLM call goes to Gemini and nothing is cached
+    LLM_CACHE_TTL: int = 86400  # Seconds cached LLM results are kept in Redis (24h)
+    LLM_PARSE_CACHE_TTL: int = 2592000  # Seconds cached PDF parse results are kept in Redis (30d)
+    LLM_CACHE_MAXSIZE: int = 4096  # Max entries in the in-process LLM result cache
+    GEMINI_MAX_CONCURRENCY: int = 8  # Max in-flight async Gemini calls per event loop
+    GEMINI_RPM: int = 10  # Requests per minute allowed by the Gemini plan (free tier: 10)
+    GEMINI_TPM: int = 1000000  # Tokens per minute allowed by the Gemini plan
+    GEMINI_BREAKER_FAIL_MAX: int = 5  # Consecutive Gemini quota errors (retry attempts included) that open the circuit
+    GEMINI_BREAKER_RESET: int = 60  # Seconds the Gemini circuit stays open before a trial call
+    GEMINI_MAX_OUT_EVALUATE: int = 512  # Output token cap per evaluated answer
+    GEMINI_MAX_OUT_QUALITY_CHECK: int = 256  # Output token cap of a quality check
+    GEMINI_MAX_OUT_ANALYZE: int = 512  # Output token cap per performance analysis
 
     # Sentry (Optional)
     SENTRY_DSN: str = ""